@@ -0,0 +1,259 @@
+"""
+benchmark_sharding.py
+
+Вимірює пропускну здатність бота залежно від кількості процесів-обробників.
+Замість Telegram Bot API використовується локальний сервер із штучною затримкою.
+Для порівняння вимірюється також один процес з одночасною обробкою оновлень
+(concurrent_updates), а обробку кожного оновлення можна додатково навантажити
+роботою процесора.
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from main import BmpBot, run_from_command_line
+
+BMP_CHAT_ID = -1001290587927
+DEVELOPER_CHAT_ID = 1
+BOT_TOKEN = "123456:benchmark"
+FIRST_USER_ID = 1000
+CPU_WORK_ENV_NAME = "BENCHMARK_CPU_WORK_MS"
+
+
+class BenchmarkBmpBot(BmpBot):
+    """
+    Бот, який перед обробкою кожного повідомлення виконує задану роботу процесора
+    """
+
+    async def _handle_message(self, update, context) -> None:
+        cpu_work_in_seconds = float(os.getenv(CPU_WORK_ENV_NAME, "0")) / 1000
+        deadline = time.perf_counter() + cpu_work_in_seconds
+        while time.perf_counter() < deadline:
+            pass
+        await super()._handle_message(update, context)
+
+
+class FakeBotApi:
+    """
+    Локальна заміна Bot API, яка віддає заздалегідь задані оновлення
+    і рахує видалені повідомлення
+    """
+
+    def __init__(self, update_count: int, latency_in_seconds: float) -> None:
+        self.update_count = update_count
+        self.latency_in_seconds = latency_in_seconds
+        self.lock = threading.Lock()
+        self.get_me_count = 0
+        self.deleted_message_count = 0
+        self.next_message_id = 10_000_000
+        self.are_updates_released = False
+        self.all_messages_deleted = threading.Event()
+
+    def handle(self, method: str, params: dict) -> object:
+        """
+        Обробляє виклик методу Bot API
+        """
+
+        if method == "getUpdates":
+            return self._get_updates(params)
+
+        time.sleep(self.latency_in_seconds)
+
+        with self.lock:
+            if method == "getMe":
+                self.get_me_count += 1
+                return {"id": 1, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot"}
+            if method == "getChat":
+                return {"id": int(params["chat_id"]), "type": "supergroup", "title": "Benchmark"}
+            if method == "getChatMember":
+                user_id = int(params["user_id"])
+                return {"status": "member", "user": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"}}
+            if method in ("sendMessage", "forwardMessage"):
+                self.next_message_id += 1
+                return {
+                    "message_id": self.next_message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": int(params["chat_id"]), "type": "supergroup"},
+                }
+            if method == "deleteMessage":
+                self.deleted_message_count += 1
+                if self.deleted_message_count >= self.update_count:
+                    self.all_messages_deleted.set()
+            return True
+
+    def _get_updates(self, params: dict) -> list[dict]:
+        offset = int(params.get("offset", 1))
+        limit = int(params.get("limit", 100))
+        timeout = float(params.get("timeout", 0))
+
+        if not self.are_updates_released or offset > self.update_count:
+            time.sleep(min(timeout, 0.5))
+            return []
+
+        update_ids = range(offset, min(offset + limit, self.update_count + 1))
+        return [self._make_update(update_id) for update_id in update_ids]
+
+    def _make_update(self, update_id: int) -> dict:
+        user_id = FIRST_USER_ID + update_id
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": BMP_CHAT_ID, "type": "supergroup", "title": "Benchmark"},
+                "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"},
+                "text": "benchmark",
+            },
+        }
+
+
+def make_request_handler(api: FakeBotApi) -> type[BaseHTTPRequestHandler]:
+    """
+    Створює HTTP-обробник для FakeBotApi
+    """
+
+    class RequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_POST(self) -> None:
+            method = self.path.rsplit("/", 1)[-1]
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf8")
+            params = {key: values[0] for key, values in parse_qs(body).items()}
+            response = json.dumps({"ok": True, "result": api.handle(method, params)}).encode("utf8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(response)))
+            self.end_headers()
+            self.wfile.write(response)
+
+        def log_message(self, format, *args) -> None:  # pylint: disable=W0622
+            pass
+
+    return RequestHandler
+
+
+def run_benchmark(
+    worker_count: int,
+    concurrent_updates: int,
+    update_count: int,
+    latency_in_seconds: float,
+    cpu_work_in_ms: float,
+) -> float:
+    """
+    Повертає кількість оброблених оновлень за секунду
+    """
+
+    api = FakeBotApi(update_count, latency_in_seconds)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_request_handler(api))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    env = dict(
+        os.environ,
+        BOT_TOKEN=BOT_TOKEN,
+        BMP_CHAT_ID=str(BMP_CHAT_ID),
+        DEVELOPER_CHAT_ID=str(DEVELOPER_CHAT_ID),
+        BOT_API_BASE_URL=f"http://127.0.0.1:{server.server_address[1]}/bot",
+        **{CPU_WORK_ENV_NAME: str(cpu_work_in_ms)},
+    )
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "bot",
+                "--workers",
+                str(worker_count),
+                "--concurrent-updates",
+                str(concurrent_updates),
+            ],
+            cwd=work_dir,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+        try:
+            # Диспетчер і кожен обробник викликають getMe під час ініціалізації
+            expected_get_me_count = worker_count + 1 if worker_count > 0 else 1
+            while api.get_me_count < expected_get_me_count:
+                if process.poll() is not None:
+                    raise RuntimeError(f"Bot exited with code {process.returncode}")
+                time.sleep(0.1)
+            time.sleep(2)
+
+            start_time = time.perf_counter()
+            api.are_updates_released = True
+            if not api.all_messages_deleted.wait(timeout=600):
+                raise TimeoutError(f"Only {api.deleted_message_count} of {update_count} messages were deleted")
+            elapsed_time = time.perf_counter() - start_time
+        finally:
+            process.send_signal(signal.SIGINT)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            server.shutdown()
+
+    return update_count / elapsed_time
+
+
+def main() -> None:
+    """
+    Запускає бенчмарк
+    """
+
+    if sys.argv[1:2] == ["bot"]:
+        run_from_command_line(BenchmarkBmpBot, sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--updates", type=int, default=500, help="кількість оновлень")
+    parser.add_argument("--latency", type=float, default=0.02, help="затримка Bot API у секундах")
+    parser.add_argument(
+        "--cpu-work-ms",
+        type=float,
+        default=0,
+        help="робота процесора на кожне оновлення у мілісекундах",
+    )
+    parser.add_argument(
+        "--concurrent-updates",
+        type=int,
+        default=16,
+        help="кількість одночасно оброблюваних оновлень для порівняльного запуску в одному процесі",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4],
+        help="кількість процесів-обробників",
+    )
+    args = parser.parse_args()
+
+    runs = [("single process", 0, 1)]
+    if args.concurrent_updates > 1:
+        runs.append((f"single process, {args.concurrent_updates} concurrent", 0, args.concurrent_updates))
+    runs += [(f"{worker_count} workers", worker_count, 1) for worker_count in args.workers if worker_count > 0]
+
+    print(f"latency {args.latency * 1000:g} ms, CPU work {args.cpu_work_ms:g} ms per update, {os.cpu_count()} CPUs")
+    baseline = None
+    for mode, worker_count, concurrent_updates in runs:
+        throughput = run_benchmark(worker_count, concurrent_updates, args.updates, args.latency, args.cpu_work_ms)
+        baseline = baseline or throughput
+        print(f"{mode:>32}: {throughput:8.1f} updates/s ({throughput / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,16 @@
 main.py
 """
 
+import argparse
+import glob
 import json
 import logging
+import multiprocessing
 import os
+import queue
+import signal
 import sys
+import time
 import traceback
 from datetime import datetime, tzinfo
 
@@ -15,8 +21,9 @@ from dotenv import load_dotenv
 from telegram import Chat, ChatMember, ChatMemberLeft, Update, User as TelegramUser, Bot
 from telegram.constants import ChatMemberStatus
 from telegram.ext import Application, ApplicationBuilder, ContextTypes, MessageHandler
-from telegram.error import BadRequest
+from telegram.error import BadRequest, Forbidden, InvalidToken, RetryAfter, TelegramError, TimedOut
 import asyncio
+import uuid
 
 
 class User:
@@ -115,6 +122,99 @@ class ForwardedMessage:
         }
 
 
+class OutboxAction:
+    """
+    Один виклик Bot API у складі модераційної дії
+    """
+
+    def __init__(
+        self,
+        method: str,
+        kwargs: dict,
+        forwarded_message_thread_id: int | None = None,
+        should_record_forwarded_message: bool = False,
+        is_required: bool = False,
+        is_done: bool = False,
+        forwarded_message_id: int | None = None,
+    ) -> None:
+        self.method = method
+        self.kwargs = kwargs
+        self.forwarded_message_thread_id = forwarded_message_thread_id
+        self.should_record_forwarded_message = should_record_forwarded_message
+        self.is_required = is_required
+        self.is_done = is_done
+        self.forwarded_message_id = forwarded_message_id
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """
+        Parse OutboxAction object from dictionary
+        """
+        return cls(
+            method=data.get("method"),
+            kwargs=data.get("kwargs") or {},
+            forwarded_message_thread_id=data.get("forwarded_message_thread_id"),
+            should_record_forwarded_message=data.get("should_record_forwarded_message", False),
+            is_required=data.get("is_required", False),
+            is_done=data.get("is_done", False),
+            forwarded_message_id=data.get("forwarded_message_id"),
+        )
+
+    def to_dict(self) -> dict:
+        """
+        for JSON serialization
+        """
+
+        return {
+            "method": self.method,
+            "kwargs": self.kwargs,
+            "forwarded_message_thread_id": self.forwarded_message_thread_id,
+            "should_record_forwarded_message": self.should_record_forwarded_message,
+            "is_required": self.is_required,
+            "is_done": self.is_done,
+            "forwarded_message_id": self.forwarded_message_id,
+        }
+
+
+class OutboxEntry:
+    """
+    Всі дії щодо одного порушення, які виконуються як одне ціле
+    """
+
+    def __init__(
+        self,
+        # pylint: disable=W0622
+        id: str,
+        actions: list[OutboxAction],
+        attempts: int = 0,
+    ) -> None:
+        self.id = id
+        self.actions = actions
+        self.attempts = attempts
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """
+        Parse OutboxEntry object from dictionary
+        """
+        return cls(
+            id=data.get("id"),
+            actions=[OutboxAction.from_dict(d) for d in data.get("actions", [])],
+            attempts=data.get("attempts", 0),
+        )
+
+    def to_dict(self) -> dict:
+        """
+        for JSON serialization
+        """
+
+        return {
+            "id": self.id,
+            "actions": [action.to_dict() for action in self.actions],
+            "attempts": self.attempts,
+        }
+
+
 class TelegramHandler(logging.Handler):
     def __init__(self, bot: Bot, chat_id: int):
         super().__init__()
@@ -145,6 +245,21 @@ class TelegramHandler(logging.Handler):
         super().close()
 
 
+class ShardWorker:
+    """
+    Процес-обробник одного шарда і його черга оновлень
+    """
+
+    def __init__(self, shard_index: int) -> None:
+        self.shard_index = shard_index
+        self.process: multiprocessing.Process | None = None
+        self.update_queue: multiprocessing.Queue | None = None
+        self.pending_updates: list[dict] = []
+        self.failure_count = 0
+        self.started_at = 0.0
+        self.restart_at: float | None = None
+
+
 class BmpBot:
     """
     Бот для чату ГО "Батько МАЄ ПРАВО"
@@ -156,8 +271,15 @@ class BmpBot:
     logger: logging.Logger
     is_night_time: bool
     bot_token: str
+    bot_api_base_url: str | None
     bmp_chat_id: int
     developer_chat_id: int
+    shard_index: int = 0
+    shard_count: int = 1
+    concurrent_updates: int = 1
+    mp_context: multiprocessing.context.BaseContext
+    workers: list[ShardWorker]
+    stop_event: asyncio.Event
     ALLOWED_TOPICS = {
         "SOS": 113812,
         "ВІЛЬНА ТЕМА": 113831,
@@ -170,9 +292,22 @@ class BmpBot:
     bot_registered_user_ids: set[int]
     users: list[User]
     forwarded_messages: list[ForwardedMessage]
+    outbox: list[OutboxEntry]
+    outbox_event: asyncio.Event
+    outbox_task: asyncio.Task | None = None
     app: Application
     USERS_JSON_FILE_NAME: str = "users.json"
     FORWARDED_MESSAGES_JSON_FILE_NAME: str = "forwarded_messages.json"
+    OUTBOX_JSON_FILE_NAME: str = "outbox.json"
+    OUTBOX_MAX_CONCURRENT_ENTRIES: int = 10
+    OUTBOX_MAX_ATTEMPTS: int = 5
+    OUTBOX_RETRY_BASE_DELAY_IN_SECONDS: float = 2.0
+    OUTBOX_NON_IDEMPOTENT_METHODS: set[str] = {"forward_message", "send_message"}
+    DISPATCHER_MAX_RETRY_DELAY_IN_SECONDS: float = 30.0
+    WORKER_CHECK_INTERVAL_IN_SECONDS: float = 1.0
+    WORKER_MAX_RESTART_DELAY_IN_SECONDS: float = 60.0
+    WORKER_STABLE_UPTIME_IN_SECONDS: float = 60.0
+    WORKER_STOP_TIMEOUT_IN_SECONDS: float = 30.0
     KYIV_TIMEZONE_NAME: str = "Europe/Kiev"
     kyiv_timezone: tzinfo
     mandatory_registration_date: datetime
@@ -187,6 +322,82 @@ class BmpBot:
         Запускає бота
         """
 
+        self._build_app(has_updater=True)
+        self._reshard_state()
+        self.app.run_polling()
+
+    def main_shard(self, shard_index: int, shard_count: int, update_queue: multiprocessing.Queue) -> None:
+        """
+        Запускає обробник однієї частини (шарда) оновлень, які надсилає диспетчер
+        """
+
+        # Зупиняється лише за сигналом від диспетчера, щоб спершу обробити всі оновлення з черги
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self._build_app(has_updater=False)
+        asyncio.run(self._run_shard(update_queue))
+
+    def main_dispatcher(self, worker_count: int) -> None:
+        """
+        Отримує оновлення і розподіляє їх між процесами-обробниками
+        """
+
+        self._setup_logger()
+        self._init_secrets()
+
+        self.shard_count = worker_count
+        self._reshard_state()
+
+        self.mp_context = multiprocessing.get_context("spawn")
+        self.workers = [ShardWorker(shard_index) for shard_index in range(worker_count)]
+        for worker in self.workers:
+            self._start_worker(worker)
+
+        try:
+            asyncio.run(self._dispatch_updates())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._stop_workers()
+
+    def _start_worker(self, worker: ShardWorker) -> None:
+        worker.update_queue = self.mp_context.Queue()
+        worker.process = self.mp_context.Process(
+            target=run_shard,
+            args=(type(self), worker.shard_index, self.shard_count, self.concurrent_updates, worker.update_queue),
+            name=f"bmp-bot-shard-{worker.shard_index}",
+        )
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        worker.restart_at = None
+
+        for data in worker.pending_updates:
+            worker.update_queue.put(data)
+        worker.pending_updates = []
+
+    def _stop_workers(self) -> None:
+        for worker in self.workers:
+            if worker.pending_updates:
+                self.logger.warning(
+                    "Worker %s is not running, %s updates were lost",
+                    worker.process.name,
+                    len(worker.pending_updates),
+                )
+            if worker.process.is_alive():
+                worker.update_queue.put(None)
+
+        deadline = time.monotonic() + self.WORKER_STOP_TIMEOUT_IN_SECONDS
+        for worker in self.workers:
+            worker.process.join(max(deadline - time.monotonic(), 0))
+            if worker.process.is_alive():
+                self.logger.error("Worker %s did not stop in time, killing it", worker.process.name)
+                worker.process.kill()
+                worker.process.join()
+
+    def _build_app(self, has_updater: bool) -> None:
         self._setup_logger()
         self._init_secrets()
 
@@ -201,7 +412,14 @@ class BmpBot:
             2024, 6, 1, tzinfo=self.kyiv_timezone
         )
 
-        self.app = ApplicationBuilder().token(self.bot_token).build()
+        builder = ApplicationBuilder().token(self.bot_token).post_stop(self._stop_outbox)
+        if self.bot_api_base_url:
+            builder = builder.base_url(self.bot_api_base_url)
+        if not has_updater:
+            builder = builder.updater(None)
+        if self.concurrent_updates > 1:
+            builder = builder.concurrent_updates(self.concurrent_updates)
+        self.app = builder.build()
         self.app.add_error_handler(self._handle_error)
         self.app.job_queue.run_once(self._initialize, when=0)
         self.app.add_handler(MessageHandler(None, self._handle_message))
@@ -215,7 +433,234 @@ class BmpBot:
             self._run_hourly, interval=3600, first=seconds_till_next_hour
         )
 
-        self.app.run_polling()
+    async def _run_shard(self, update_queue: multiprocessing.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        async with self.app:
+            await self.app.start()
+            try:
+                while True:
+                    data = await loop.run_in_executor(None, update_queue.get)
+                    if data is None:
+                        break
+                    try:
+                        update = Update.de_json(data, self.app.bot)
+                    # pylint: disable=W0718
+                    except Exception:
+                        self.logger.exception("Cannot parse update: %s", data)
+                        continue
+                    await self.app.update_queue.put(update)
+            finally:
+                if self.app.running:
+                    await self.app.stop()
+                await self._stop_outbox(self.app)
+
+    async def _dispatch_updates(self) -> None:
+        if self.bot_api_base_url:
+            bot = Bot(self.bot_token, base_url=self.bot_api_base_url)
+        else:
+            bot = Bot(self.bot_token)
+
+        # Як і run_polling, зупиняємося за SIGINT/SIGTERM, а не обриваємо процес
+        self.stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, self.stop_event.set)
+
+        async with bot:
+            supervisor_task = asyncio.create_task(self._supervise_workers(bot))
+            try:
+                await self._poll_updates(bot)
+            finally:
+                supervisor_task.cancel()
+
+    async def _poll_updates(self, bot: Bot) -> None:
+        offset: int | None = None
+        retry_delay = 1.0
+        stop_task = asyncio.create_task(self.stop_event.wait())
+
+        try:
+            while not self.stop_event.is_set():
+                get_updates_task = asyncio.create_task(bot.get_updates(offset=offset, timeout=10))
+                await asyncio.wait({get_updates_task, stop_task}, return_when=asyncio.FIRST_COMPLETED)
+                if not get_updates_task.done():
+                    get_updates_task.cancel()
+                    break
+
+                try:
+                    updates = get_updates_task.result()
+                except InvalidToken:
+                    raise
+                except RetryAfter as e:
+                    self.logger.warning("Dispatcher: flood control, retrying in %s seconds", e.retry_after)
+                    await self._sleep_unless_stopped(e.retry_after)
+                    continue
+                except TelegramError as e:
+                    # Як і Updater у run_polling, не зупиняємося через збій мережі, а повторюємо запит
+                    self.logger.error("Dispatcher: failed to get updates (%s), retrying in %s seconds", e, retry_delay)
+                    await self._sleep_unless_stopped(retry_delay)
+                    retry_delay = min(retry_delay * 2, self.DISPATCHER_MAX_RETRY_DELAY_IN_SECONDS)
+                    continue
+
+                retry_delay = 1.0
+                for update in updates:
+                    data = update.to_dict()
+                    for shard_index in self._get_shard_indexes(update):
+                        self._route_update(self.workers[shard_index], data)
+                    offset = update.update_id + 1
+        finally:
+            stop_task.cancel()
+
+        # Підтверджуємо отримані оновлення, щоб після перезапуску Telegram не надіслав їх повторно
+        if offset is not None:
+            try:
+                await bot.get_updates(offset=offset, timeout=0, limit=1)
+            except TelegramError as e:
+                self.logger.error("Dispatcher: failed to confirm updates: %s", e)
+
+    async def _sleep_unless_stopped(self, delay: float) -> None:
+        try:
+            await asyncio.wait_for(self.stop_event.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+    def _route_update(self, worker: ShardWorker, data: dict) -> None:
+        # Оновлення для непрацюючого обробника зберігаємо, поки його не буде перезапущено
+        if worker.restart_at is not None or not worker.process.is_alive():
+            worker.pending_updates.append(data)
+        else:
+            worker.update_queue.put(data)
+
+    async def _supervise_workers(self, bot: Bot) -> None:
+        while True:
+            for worker in self.workers:
+                await self._check_worker(bot, worker)
+            await asyncio.sleep(self.WORKER_CHECK_INTERVAL_IN_SECONDS)
+
+    async def _check_worker(self, bot: Bot, worker: ShardWorker) -> None:
+        now = time.monotonic()
+
+        if worker.restart_at is None:
+            if worker.process.is_alive():
+                if now - worker.started_at >= self.WORKER_STABLE_UPTIME_IN_SECONDS:
+                    worker.failure_count = 0
+                return
+
+            lost_update_count = self._take_unread_updates(worker)
+            worker.failure_count += 1
+            restart_delay = min(2 ** (worker.failure_count - 1), self.WORKER_MAX_RESTART_DELAY_IN_SECONDS)
+            worker.restart_at = now + restart_delay
+
+            error_message = (
+                f"Worker {worker.process.name} exited with code {worker.process.exitcode} "
+                f"(failure {worker.failure_count} in a row), restarting in {restart_delay} seconds. "
+                f"{lost_update_count} updates were lost"
+            )
+            self.logger.error(error_message)
+            if worker.failure_count == 1:
+                try:
+                    await bot.send_message(self.developer_chat_id, error_message)
+                except TelegramError as e:
+                    self.logger.error("Dispatcher: failed to notify developer: %s", e)
+
+        if now >= worker.restart_at:
+            self._start_worker(worker)
+
+    def _take_unread_updates(self, worker: ShardWorker) -> int | str:
+        # Процес міг завершитися посеред читання і залишити чергу заблокованою,
+        # тому забираємо з неї все, що вдасться, а новий процес отримає нову чергу
+        unread_updates = []
+        while True:
+            try:
+                unread_updates.append(worker.update_queue.get(block=False))
+            except (queue.Empty, EOFError, OSError):
+                break
+        worker.pending_updates = unread_updates + worker.pending_updates
+
+        try:
+            lost_update_count = worker.update_queue.qsize()
+        except NotImplementedError:
+            lost_update_count = "unknown number of"
+        worker.update_queue.cancel_join_thread()
+        worker.update_queue.close()
+        return lost_update_count
+
+    def _get_shard_indexes(self, update: Update) -> set[int]:
+        # В основному чаті розподіляємо за користувачем, щоб його повідомлення
+        # і приватна реєстрація у боті потрапляли до одного й того ж шарда
+        chat = update.effective_chat
+        user = update.effective_user
+        message = update.message or update.edited_message
+
+        if message is not None and message.new_chat_members:
+            # Запис про нового учасника має потрапити до його власного шарда, а не до шарда того, хто його додав
+            return {self._get_user_shard_index(new_member.id) for new_member in message.new_chat_members}
+        if user is not None and (chat is None or chat.id == self.bmp_chat_id):
+            return {self._get_user_shard_index(user.id)}
+        if chat is not None:
+            return {chat.id % self.shard_count}
+        return {0}
+
+    def _get_user_shard_index(self, user_id: int) -> int:
+        return user_id % self.shard_count
+
+    def _owns_scheduled_jobs(self) -> bool:
+        return self.shard_index == 0
+
+    def _get_state_file_name(self, file_name: str) -> str:
+        return self._get_shard_file_name(file_name, self.shard_index, self.shard_count)
+
+    def _get_shard_file_name(self, file_name: str, shard_index: int, shard_count: int) -> str:
+        if shard_count == 1:
+            return file_name
+        name, extension = os.path.splitext(file_name)
+        return f"{name}.shard-{shard_index}{extension}"
+
+    def _reshard_state(self) -> None:
+        # Об'єднує стан зі спільних файлів і файлів шардів з будь-якою попередньою
+        # кількістю обробників і розподіляє його між файлами поточних шардів
+        shard_indexes = range(self.shard_count)
+
+        users = self._merge_state_files(self.USERS_JSON_FILE_NAME, "id")
+        shard_users: list[list[dict]] = [[] for _ in shard_indexes]
+        for user in users:
+            shard_users[self._get_user_shard_index(user["id"])].append(user)
+        self._replace_state_files(self.USERS_JSON_FILE_NAME, shard_users)
+
+        # Пересилання і незавершені дії не прив'язані до користувача, тому їх виконує шард 0
+        for file_name, key in (
+            (self.FORWARDED_MESSAGES_JSON_FILE_NAME, "message_id"),
+            (self.OUTBOX_JSON_FILE_NAME, "id"),
+        ):
+            items = self._merge_state_files(file_name, key)
+            self._replace_state_files(file_name, [items if shard_index == 0 else [] for shard_index in shard_indexes])
+
+    def _find_state_files(self, file_name: str) -> list[str]:
+        name, extension = os.path.splitext(file_name)
+        shard_file_names = sorted(glob.glob(f"{glob.escape(name)}.shard-*{glob.escape(extension)}"))
+        return [f for f in [file_name, *shard_file_names] if os.path.exists(f)]
+
+    def _merge_state_files(self, file_name: str, key: str) -> list[dict]:
+        # Якщо попереднє перерозподілення перервалося, той самий запис може бути у кількох файлах
+        items: dict = {}
+        for state_file_name in self._find_state_files(file_name):
+            with open(file=state_file_name, mode="r", encoding="utf8") as file:
+                for item in json.load(file):
+                    items[item[key]] = item
+        return list(items.values())
+
+    def _replace_state_files(self, file_name: str, shard_items: list[list[dict]]) -> None:
+        old_file_names = self._find_state_files(file_name)
+        new_file_names = [
+            self._get_shard_file_name(file_name, shard_index, len(shard_items))
+            for shard_index in range(len(shard_items))
+        ]
+
+        # Спочатку записуємо нові файли, і лише потім видаляємо старі
+        for new_file_name, items in zip(new_file_names, shard_items):
+            self._write_json_file(new_file_name, items)
+        for old_file_name in old_file_names:
+            if old_file_name not in new_file_names:
+                os.remove(old_file_name)
 
     def _get_topic_link(self, topic_name: str) -> str:
         short_bmp_chat_id = str(self.bmp_chat_id)[-10:]
@@ -242,6 +687,7 @@ class BmpBot:
     def _init_secrets(self) -> None:
         load_dotenv()
         self.bot_token = self._get_env("BOT_TOKEN")
+        self.bot_api_base_url = os.getenv("BOT_API_BASE_URL")
         self.bmp_chat_id = int(self._get_env("BMP_CHAT_ID"))
         self.developer_chat_id = int(self._get_env("DEVELOPER_CHAT_ID"))
 
@@ -265,9 +711,9 @@ class BmpBot:
         telegram_handler.setFormatter(telegram_formatter)
         self.logger.addHandler(telegram_handler)
 
-        if os.path.exists(self.USERS_JSON_FILE_NAME):
+        if os.path.exists(self._get_state_file_name(self.USERS_JSON_FILE_NAME)):
             with open(
-                file=self.USERS_JSON_FILE_NAME, mode="r", encoding="utf8"
+                file=self._get_state_file_name(self.USERS_JSON_FILE_NAME), mode="r", encoding="utf8"
             ) as file:
                 self.users: list[User] = [User.from_dict(d) for d in json.load(file)]
         else:
@@ -285,17 +731,31 @@ class BmpBot:
         )
         self.logger.debug("Init: is_night_time = %s", self.is_night_time)
 
-        chat: Chat = await context.bot.get_chat(self.bmp_chat_id)
-        await self._refresh_users(chat)
-
-        if os.path.exists(self.FORWARDED_MESSAGES_JSON_FILE_NAME):
+        if os.path.exists(self._get_state_file_name(self.FORWARDED_MESSAGES_JSON_FILE_NAME)):
             with open(
-                file=self.FORWARDED_MESSAGES_JSON_FILE_NAME, mode="r", encoding="utf8"
+                file=self._get_state_file_name(self.FORWARDED_MESSAGES_JSON_FILE_NAME), mode="r", encoding="utf8"
             ) as file:
                 self.forwarded_messages: list[ForwardedMessage] = [ForwardedMessage.from_dict(d) for d in json.load(file)]
         else:
             self.forwarded_messages: list[ForwardedMessage] = []
 
+        if os.path.exists(self._get_state_file_name(self.OUTBOX_JSON_FILE_NAME)):
+            with open(
+                file=self._get_state_file_name(self.OUTBOX_JSON_FILE_NAME), mode="r", encoding="utf8"
+            ) as file:
+                self.outbox: list[OutboxEntry] = [OutboxEntry.from_dict(d) for d in json.load(file)]
+        else:
+            self.outbox: list[OutboxEntry] = []
+
+        if self.outbox:
+            self.logger.info("Resuming %s unfinished outbox entries", len(self.outbox))
+
+        self.outbox_event = asyncio.Event()
+        self.outbox_event.set()
+        self.outbox_task = asyncio.create_task(self._process_outbox(context.bot))
+
+        chat: Chat = await context.bot.get_chat(self.bmp_chat_id)
+        await self._refresh_users(chat)
 
     def _handle_unhandled_exceptions(self, exc_type, exc_value, exc_traceback) -> None:
         if issubclass(exc_type, KeyboardInterrupt):
@@ -347,6 +807,9 @@ class BmpBot:
             self.logger.debug("message: is_night_time = %s", self.is_night_time)
             if message.new_chat_members:
                 for new_member in message.new_chat_members:
+                    if self._get_user_shard_index(new_member.id) != self.shard_index:
+                        continue
+
                     self.logger.info("New user registered: %s", new_member.id)
                     user_link = self._make_user_link(new_member)
 
@@ -412,46 +875,69 @@ class BmpBot:
 
             if should_remove:
                 user_link = self._make_user_link(message.from_user)
+                actions: list[OutboxAction] = []
 
                 if should_redirect:
-                    forwarded_message = await context.bot.forward_message(
-                        chat_id=self.bmp_chat_id,
-                        from_chat_id=self.bmp_chat_id,
-                        message_id=message.message_id,
-                        message_thread_id=self.ALLOWED_TOPICS["НІЧНІ ПОВІДОМЛЕННЯ"],
+                    actions.append(
+                        OutboxAction(
+                            method="forward_message",
+                            kwargs={
+                                "chat_id": self.bmp_chat_id,
+                                "from_chat_id": self.bmp_chat_id,
+                                "message_id": message.message_id,
+                                "message_thread_id": self.ALLOWED_TOPICS["НІЧНІ ПОВІДОМЛЕННЯ"],
+                            },
+                            forwarded_message_thread_id=message.message_thread_id if message.is_topic_message else None,
+                            should_record_forwarded_message=True,
+                            is_required=True,
+                        )
                     )
-
-                    self.forwarded_messages.append(ForwardedMessage(forwarded_message.message_id, message.message_thread_id if message.is_topic_message else None))
-                    self._update_forwarded_messages_json()
-
-                    await context.bot.send_message(
-                        chat_id=self.bmp_chat_id,
-                        message_thread_id=self.BOT_TOPIC_ID,
-                        text=(
-                            f"Шановний {user_link}, ваше повідомлення було переправлено у топік "
-                            f"{self.night_topic_link}, оскільки ви намагалися написати у "
-                            "недозволений топік під час режиму тиші.\n"
-                            f"Будь ласка, дотримуйтесь [правил]({self.silence_rule_link}) чату."
-                        ),
-                        parse_mode="Markdown",
+                    actions.append(
+                        OutboxAction(
+                            method="send_message",
+                            kwargs={
+                                "chat_id": self.bmp_chat_id,
+                                "message_thread_id": self.BOT_TOPIC_ID,
+                                "text": (
+                                    f"Шановний {user_link}, ваше повідомлення було переправлено у топік "
+                                    f"{self.night_topic_link}, оскільки ви намагалися написати у "
+                                    "недозволений топік під час режиму тиші.\n"
+                                    f"Будь ласка, дотримуйтесь [правил]({self.silence_rule_link}) чату."
+                                ),
+                                "parse_mode": "Markdown",
+                            },
+                        )
                     )
                 else:
-                    await context.bot.send_message(
-                        chat_id=self.bmp_chat_id,
-                        message_thread_id=self.BOT_TOPIC_ID,
-                        text=(
-                            f"Шановний {user_link}, ваше повідомлення було видалене, "
-                            "оскільки ви ще не зареєструвалися у чат-боті.\n"
-                            f"Будь ласка, дотримуйтесь [правил]({self.registration_rule_link}) "
-                            "чату.\n"
-                            "Для того, щоб зареєструватися у чат-боті @BatkoMaePravoBot, треба написати йому одне приватне повідомлення з довільним текстом."
-                        ),
-                        parse_mode="Markdown",
+                    actions.append(
+                        OutboxAction(
+                            method="send_message",
+                            kwargs={
+                                "chat_id": self.bmp_chat_id,
+                                "message_thread_id": self.BOT_TOPIC_ID,
+                                "text": (
+                                    f"Шановний {user_link}, ваше повідомлення було видалене, "
+                                    "оскільки ви ще не зареєструвалися у чат-боті.\n"
+                                    f"Будь ласка, дотримуйтесь [правил]({self.registration_rule_link}) "
+                                    "чату.\n"
+                                    "Для того, щоб зареєструватися у чат-боті @BatkoMaePravoBot, треба написати йому одне приватне повідомлення з довільним текстом."
+                                ),
+                                "parse_mode": "Markdown",
+                            },
+                        )
                     )
 
-                await context.bot.delete_message(
-                    chat_id=self.bmp_chat_id, message_id=message.message_id
+                actions.append(
+                    OutboxAction(
+                        method="delete_message",
+                        kwargs={
+                            "chat_id": self.bmp_chat_id,
+                            "message_id": message.message_id,
+                        },
+                    )
                 )
+
+                self._enqueue_outbox_entry(actions)
         else:
             if not self._is_active(chat_member):
                 await context.bot.send_message(
@@ -497,6 +983,10 @@ class BmpBot:
     async def _start_night_time(self, context: ContextTypes.DEFAULT_TYPE) -> None:
         self.is_night_time = True
         self.logger.debug("startNightTime: is_night_time = True")
+
+        if not self._owns_scheduled_jobs():
+            return
+
         tomorrow_in_kyiv = self._tomorrow_in_kyiv()
         night_time_end_hour = self._night_time_end_hour(tomorrow_in_kyiv)
 
@@ -534,29 +1024,30 @@ class BmpBot:
         bot_registered_users_count = len(bot_registered_users)
         active_users_count = len(active_users)
 
-        await context.bot.send_message(
-            chat_id=self.bmp_chat_id,
-            message_thread_id=self.BOT_TOPIC_ID,
-            text=(
-                "Батьки, режим тиші закінчився. Можна вільно писати у всіх "
-                f"топіках до {self.NIGHT_TIME_START_HOUR}:00."
-            ),
-            parse_mode="Markdown",
-        )
-
-        if self._is_monday_or_friday(self._now_in_kyiv()):
+        if self._owns_scheduled_jobs():
             await context.bot.send_message(
                 chat_id=self.bmp_chat_id,
+                message_thread_id=self.BOT_TOPIC_ID,
                 text=(
-                    "‼️НАГАДУЄМО ПРО ОБОВ'ЯЗКОВІСТЬ СПЛАТИ БЛАГОДІЙНИХ ВНЕСКІВ ЗГІДНО "
-                    "ПРАВИЛ ГРУПИ. НЕСПЛАТА ВНЕСКІВ ПРИЗВОДИТЬ ДО ВИДАЛЕННЯ З ГРУП "
-                    "ГО БАТЬКО МАЄ ПРАВО.\n"
-                    "Правила сплати благодійних внесків за посиланням:\n"
-                    f"{self.payments_rule_link} ‼️"
+                    "Батьки, режим тиші закінчився. Можна вільно писати у всіх "
+                    f"топіках до {self.NIGHT_TIME_START_HOUR}:00."
                 ),
                 parse_mode="Markdown",
             )
 
+            if self._is_monday_or_friday(self._now_in_kyiv()):
+                await context.bot.send_message(
+                    chat_id=self.bmp_chat_id,
+                    text=(
+                        "‼️НАГАДУЄМО ПРО ОБОВ'ЯЗКОВІСТЬ СПЛАТИ БЛАГОДІЙНИХ ВНЕСКІВ ЗГІДНО "
+                        "ПРАВИЛ ГРУПИ. НЕСПЛАТА ВНЕСКІВ ПРИЗВОДИТЬ ДО ВИДАЛЕННЯ З ГРУП "
+                        "ГО БАТЬКО МАЄ ПРАВО.\n"
+                        "Правила сплати благодійних внесків за посиланням:\n"
+                        f"{self.payments_rule_link} ‼️"
+                    ),
+                    parse_mode="Markdown",
+                )
+
         for forwarded_message in self.forwarded_messages:
             await context.bot.forward_message(
                 chat_id=self.bmp_chat_id,
@@ -576,23 +1067,141 @@ class BmpBot:
         elif hour == self._night_time_end_hour(now_in_kyiv):
             await self._end_night_time(context)
 
-    def _update_users_json(self) -> None:
-        with open(file=self.USERS_JSON_FILE_NAME, mode="w", encoding="utf8") as file:
+    def _write_json_file(self, file_name: str, data: list) -> None:
+        # Пишемо у тимчасовий файл і підміняємо ним старий, щоб збій посеред запису
+        # не залишив пошкоджений JSON
+        temp_file_name = f"{file_name}.tmp"
+        with open(file=temp_file_name, mode="w", encoding="utf8") as file:
             json.dump(
-                [user.to_dict() for user in self.users],
+                data,
                 file,
                 ensure_ascii=False,
                 indent=2,
             )
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_file_name, file_name)
+
+    def _update_users_json(self) -> None:
+        self._write_json_file(
+            self._get_state_file_name(self.USERS_JSON_FILE_NAME),
+            [user.to_dict() for user in self.users],
+        )
 
     def _update_forwarded_messages_json(self) -> None:
-        with open(file=self.FORWARDED_MESSAGES_JSON_FILE_NAME, mode="w", encoding="utf8") as file:
-            json.dump(
-                [forwarded_message.to_dict() for forwarded_message in self.forwarded_messages],
-                file,
-                ensure_ascii=False,
-                indent=2,
-            )
+        self._write_json_file(
+            self._get_state_file_name(self.FORWARDED_MESSAGES_JSON_FILE_NAME),
+            [forwarded_message.to_dict() for forwarded_message in self.forwarded_messages],
+        )
+
+    def _update_outbox_json(self) -> None:
+        self._write_json_file(
+            self._get_state_file_name(self.OUTBOX_JSON_FILE_NAME),
+            [entry.to_dict() for entry in self.outbox],
+        )
+
+    def _enqueue_outbox_entry(self, actions: list[OutboxAction]) -> None:
+        entry = OutboxEntry(id=uuid.uuid4().hex, actions=actions)
+        self.outbox.append(entry)
+        self._update_outbox_json()
+        self.outbox_event.set()
+
+    async def _process_outbox(self, bot: Bot) -> None:
+        semaphore = asyncio.Semaphore(self.OUTBOX_MAX_CONCURRENT_ENTRIES)
+        delivery_tasks: dict[str, asyncio.Task] = {}
+
+        try:
+            while True:
+                await self.outbox_event.wait()
+                self.outbox_event.clear()
+
+                for entry in self.outbox:
+                    if entry.id in delivery_tasks:
+                        continue
+                    task = asyncio.create_task(self._deliver_outbox_entry(bot, entry, semaphore))
+                    task.add_done_callback(lambda _, entry_id=entry.id: delivery_tasks.pop(entry_id, None))
+                    delivery_tasks[entry.id] = task
+        finally:
+            for task in list(delivery_tasks.values()):
+                task.cancel()
+
+    async def _stop_outbox(self, _: Application) -> None:
+        # Незавершені записи лишаються у файлі і будуть виконані після перезапуску
+        if self.outbox_task is not None:
+            self.outbox_task.cancel()
+
+    async def _deliver_outbox_entry(self, bot: Bot, entry: OutboxEntry, semaphore: asyncio.Semaphore) -> None:
+        while True:
+            # Семафор тримаємо лише на час спроби, щоб очікування повтору не займало місце інших записів
+            async with semaphore:
+                try:
+                    for action in entry.actions:
+                        if action.is_done:
+                            # Запис про пересилання міг не зберегтися, якщо процес впав одразу після позначки is_done
+                            self._record_forwarded_message(action)
+                            continue
+                        if not await self._execute_outbox_action(bot, action):
+                            self.logger.warning(
+                                "Outbox entry %s aborted: required action %s failed",
+                                entry.id,
+                                action.method,
+                            )
+                            break
+                        action.is_done = True
+                        self._update_outbox_json()
+                        self._record_forwarded_message(action)
+                    break
+                except RetryAfter as e:
+                    self.logger.warning("Outbox entry %s: flood control, retrying in %s seconds", entry.id, e.retry_after)
+                    delay = e.retry_after
+                # pylint: disable=W0718
+                except Exception as e:
+                    entry.attempts += 1
+                    self._update_outbox_json()
+                    if entry.attempts >= self.OUTBOX_MAX_ATTEMPTS:
+                        self.logger.error(
+                            "Outbox entry %s abandoned after %s attempts: %s",
+                            entry.id,
+                            entry.attempts,
+                            e,
+                        )
+                        break
+                    delay = self.OUTBOX_RETRY_BASE_DELAY_IN_SECONDS * 2 ** (entry.attempts - 1)
+                    self.logger.warning("Outbox entry %s failed (%s), retrying in %s seconds", entry.id, e, delay)
+
+            await asyncio.sleep(delay)
+
+        self.outbox.remove(entry)
+        self._update_outbox_json()
+
+    async def _execute_outbox_action(self, bot: Bot, action: OutboxAction) -> bool:
+        try:
+            result = await getattr(bot, action.method)(**action.kwargs)
+        except (BadRequest, Forbidden) as e:
+            # Повтор не допоможе (наприклад, повідомлення вже видалене).
+            # Необов'язкову дію пропускаємо, а без обов'язкової решту дій виконувати не можна
+            self.logger.warning("Outbox action %s failed permanently: %s", action.method, e.message)
+            return not action.is_required
+        except TimedOut as e:
+            if action.method not in self.OUTBOX_NON_IDEMPOTENT_METHODS:
+                raise
+            # Telegram міг уже виконати запит, тому повтор може продублювати повідомлення
+            self.logger.warning("Outbox action %s timed out and will not be retried: %s", action.method, e.message)
+            return not action.is_required
+
+        if action.should_record_forwarded_message:
+            # Зберігається разом з позначкою is_done одним записом outbox
+            action.forwarded_message_id = result.message_id
+
+        return True
+
+    def _record_forwarded_message(self, action: OutboxAction) -> None:
+        if not action.should_record_forwarded_message or action.forwarded_message_id is None:
+            return
+        if any(m.message_id == action.forwarded_message_id for m in self.forwarded_messages):
+            return
+        self.forwarded_messages.append(ForwardedMessage(action.forwarded_message_id, action.forwarded_message_thread_id))
+        self._update_forwarded_messages_json()
 
     def _make_user_link(self, user: User) -> str:
         user_name = user.username or user.first_name or "Учасник"
@@ -624,5 +1233,49 @@ class BmpBot:
     def _is_active(self, chat_member: ChatMember) -> bool:
         return self._is_admin(chat_member) or chat_member.status == ChatMemberStatus.MEMBER
 
+def run_shard(
+    bot_class: type[BmpBot],
+    shard_index: int,
+    shard_count: int,
+    concurrent_updates: int,
+    update_queue: multiprocessing.Queue,
+) -> None:
+    """
+    Точка входу процесу-обробника
+    """
+
+    bot = bot_class()
+    bot.concurrent_updates = concurrent_updates
+    bot.main_shard(shard_index, shard_count, update_queue)
+
+
+def run_from_command_line(bot_class: type[BmpBot], args: list[str] | None = None) -> None:
+    """
+    Розбирає аргументи командного рядка і запускає бота
+    """
+
+    parser = argparse.ArgumentParser(description=bot_class.__doc__.strip())
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="кількість процесів-обробників; 0 - запуск в одному процесі",
+    )
+    parser.add_argument(
+        "--concurrent-updates",
+        type=int,
+        default=1,
+        help="скільки оновлень кожен процес може обробляти одночасно",
+    )
+    parsed_args = parser.parse_args(args)
+
+    bot = bot_class()
+    bot.concurrent_updates = parsed_args.concurrent_updates
+    if parsed_args.workers > 0:
+        bot.main_dispatcher(parsed_args.workers)
+    else:
+        bot.main()
+
+
 if __name__ == "__main__":
-    BmpBot().main()
+    run_from_command_line(BmpBot)